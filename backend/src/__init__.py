@@ -31,6 +31,15 @@ def create_app(config_class=Config):
     # Import and register blueprints/routes
     from src import routes
     app.register_blueprint(routes.bp)
+
+    # Optional comment sharding (no-op unless COMMENT_SHARDS is configured)
+    from src.sharding import shards, shards_cli
+    shards.init_app(app)
+
+    # Register CLI commands ('flask stats rebuild|check', 'flask shards migrate')
+    from src.stats import stats_cli
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(shards_cli)
     
     # Create database tables if they don't exist
     # This is fine for development, but for production, you'd use migrations
@@ -10,8 +10,19 @@ class Config:
         'sqlite:///' + os.path.join(basedir, '..', 'app.db') # Place db in root
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Optional comment sharding: COMMENT_SHARD_URLS is a comma separated list of
+    # database URLs, e.g. 'sqlite:///shard0.db,sqlite:///shard1.db'.
+    # Comments are routed by a hash of task_id, so don't reorder or resize this
+    # list without moving the data. When enabling sharding on an existing
+    # database, run 'flask shards migrate' to move its comments onto the shards.
+    _shard_urls = [url for url in os.environ.get('COMMENT_SHARD_URLS', '').split(',') if url]
+    SQLALCHEMY_BINDS = {f'shard{index}': url for index, url in enumerate(_shard_urls)}
+    COMMENT_SHARDS = list(SQLALCHEMY_BINDS) # Bind keys, in shard order
+
 class TestingConfig(Config):
     """Configuration for testing."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:' # Use in-memory db for tests
     WTF_CSRF_ENABLED = False # Disable CSRF forms in tests
+    SQLALCHEMY_BINDS = {} # Never pair the in-memory db with shard files from COMMENT_SHARD_URLS
+    COMMENT_SHARDS = []
@@ -11,18 +11,24 @@ class Task(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     
     # Relationship to comments
-    # backref='task' creates a 'task' attribute on the Comment model
     # lazy=True means SQLAlchemy will load the comments as needed
-    comments = db.relationship('Comment', backref='task', lazy=True, cascade="all, delete-orphan")
+    # NOTE: this only sees the primary database. With comment sharding enabled
+    # (see src/sharding.py) it is always empty; query the task's shard instead.
+    # There is deliberately no 'comment.task' backref: on a shard session it
+    # would query a 'task' table that only exists on the primary database.
+    comments = db.relationship('Comment', lazy=True, cascade="all, delete-orphan")
 
-    def to_dict(self):
-        """Serialize Task object to a dictionary."""
+    def to_dict(self, comment_count):
+        """
+        Serialize Task object to a dictionary.
+        'comment_count' is counted by the caller, since comments may live on a shard.
+        """
         return {
             'id': self.id,
             'title': self.title,
             'description': self.description,
             'created_at': self.created_at.isoformat() + 'Z',
-            'comment_count': len(self.comments)
+            'comment_count': comment_count
         }
 
 class Comment(db.Model):
@@ -44,3 +50,52 @@ class Comment(db.Model):
             'created_at': self.created_at.isoformat() + 'Z',
             'task_id': self.task_id
         }
+
+
+class TaskStats(db.Model):
+    """
+    Per-task activity summary.
+    Maintained by the comment routes in the same transaction as the
+    comment itself, so stats can be served without scanning comments.
+    """
+    __tablename__ = 'task_stats'
+
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), primary_key=True)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+    last_comment_at = db.Column(db.DateTime, nullable=True)
+    last_activity_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        """Serialize TaskStats object to a dictionary."""
+        return {
+            'task_id': self.task_id,
+            'comment_count': self.comment_count,
+            'last_comment_at': _isoformat(self.last_comment_at),
+            'last_activity_at': _isoformat(self.last_activity_at)
+        }
+
+class TaskDailyStats(db.Model):
+    """
+    Number of comments created on a task per (UTC) day.
+    Only the rolling stats window is kept; older buckets are pruned on write.
+    """
+    __tablename__ = 'task_daily_stats'
+
+    task_id = db.Column(db.Integer, db.ForeignKey('task.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    comment_count = db.Column(db.Integer, nullable=False, default=0)
+
+class CommentIdSequence(db.Model):
+    """
+    Per-shard id allocator used when comments are sharded (see src/sharding.py).
+    Each row hands out one sequence number and is deleted right away;
+    AUTOINCREMENT (SQLite) / SERIAL (PostgreSQL) never reuse its id.
+    """
+    __tablename__ = 'comment_id_seq'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+
+def _isoformat(value):
+    """Format an optional datetime the same way the other models do."""
+    return value.isoformat() + 'Z' if value else None
@@ -1,8 +1,19 @@
-from flask import Blueprint, jsonify, request, abort
+from flask import Blueprint, jsonify, request, abort, current_app
+from werkzeug.exceptions import HTTPException, BadRequest, InternalServerError, default_exceptions
+from werkzeug.test import EnvironBuilder
 from src.models import db, Task, Comment
+from src import stats
+from src.sharding import shards
+from sqlalchemy import func
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Upper bound on the number of sub-requests accepted by POST /api/batch
+MAX_BATCH_REQUESTS = 100
+
+# Sub-request methods that don't commit (see collect_lookups)
+READ_METHODS = ('GET', 'HEAD')
+
 # --- Helper Functions ---
 
 def get_task_or_404(task_id):
@@ -16,11 +27,60 @@ def get_task_or_404(task_id):
 def get_comment_or_404(comment_id):
     """Get a comment by ID, aborting with 404 if not found."""
     # --- FIX for LegacyAPIWarning ---
-    comment = db.session.get(Comment, comment_id)
+    comment = shards.session_for_comment(comment_id).get(Comment, comment_id)
     if not comment:
         abort(404, description=f"Comment with id {comment_id} not found.")
     return comment
 
+def count_comments(session, task_ids):
+    """Count comments per task with a single query. Tasks without comments map to 0."""
+    counts = dict(session.execute(
+        db.select(Comment.task_id, func.count(Comment.id))
+        .where(Comment.task_id.in_(task_ids))
+        .group_by(Comment.task_id)
+    ).all())
+    return {task_id: counts.get(task_id, 0) for task_id in task_ids}
+
+def prefetch_lookups(task_ids, comment_ids):
+    """
+    Load the given tasks and comments with one IN query per database, so
+    later get_task_or_404/get_comment_or_404 calls are served from the
+    session's identity map. The identity map only holds weak references,
+    so the caller must keep the returned list alive while it needs them.
+    """
+    loaded = []
+    if task_ids:
+        loaded += db.session.scalars(db.select(Task).where(Task.id.in_(task_ids))).all()
+
+    groups = {}
+    for comment_id in comment_ids:
+        groups.setdefault(shards.session_for_comment(comment_id), []).append(comment_id)
+    for session, ids in groups.items():
+        loaded += session.scalars(db.select(Comment).where(Comment.id.in_(ids))).all()
+    return loaded
+
+def collect_lookups(routed):
+    """
+    Task and comment ids referenced by the routed batch sub-requests, up to
+    and including the first write. A write commits, which expires everything
+    loaded before it, so prefetching past it would be wasted.
+    """
+    task_ids, comment_ids = set(), set()
+    for _, method, view_args in routed:
+        if isinstance(view_args, HTTPException):
+            continue
+        if 'task_id' in view_args:
+            task_ids.add(view_args['task_id'])
+        if 'comment_id' in view_args:
+            comment_ids.add(view_args['comment_id'])
+        if method not in READ_METHODS:
+            break
+    return task_ids, comment_ids
+
+def error_body(error):
+    """Same JSON error body as the error handlers below."""
+    return {'error': error.name, 'message': error.description}
+
 # --- Task Routes (for context) ---
 
 @bp.route('/tasks', methods=['POST'])
@@ -33,20 +93,37 @@ def create_task():
     new_task = Task(title=data['title'], description=data.get('description'))
     db.session.add(new_task)
     db.session.commit()
-    return jsonify(new_task.to_dict()), 201
+    return jsonify(new_task.to_dict(comment_count=0)), 201
 
 @bp.route('/tasks', methods=['GET'])
 def get_tasks():
     """Get all tasks."""
     # .all() is fine on the query object for now, or use db.session.scalars()
     tasks = Task.query.all() 
-    return jsonify([task.to_dict() for task in tasks]), 200
+    # Comments may be spread across shards; count them all in one pass
+    counts = shards.fan_out([task.id for task in tasks], count_comments)
+    return jsonify([task.to_dict(comment_count=counts[task.id]) for task in tasks]), 200
 
 @bp.route('/tasks/<int:task_id>', methods=['GET'])
 def get_task(task_id):
     """Get a single task by its ID."""
     task = get_task_or_404(task_id)
-    return jsonify(task.to_dict()), 200
+    counts = count_comments(shards.session_for_task(task.id), [task.id])
+    return jsonify(task.to_dict(comment_count=counts[task.id])), 200
+
+# --- Task Stats Routes ---
+
+@bp.route('/tasks/stats', methods=['GET'])
+def get_all_task_stats():
+    """Get activity stats for all tasks."""
+    return jsonify(stats.get_all_task_stats()), 200
+
+@bp.route('/tasks/<int:task_id>/stats', methods=['GET'])
+def get_task_stats(task_id):
+    """Get activity stats for a single task."""
+    # Ensure the task exists
+    task = get_task_or_404(task_id)
+    return jsonify(stats.get_task_stats(task.id, session=shards.session_for_task(task.id))), 200
 
 # --- Comment CRUD Routes (Task #1) ---
 
@@ -66,10 +143,15 @@ def add_comment(task_id):
     if not content:
         abort(400, description="'content' cannot be empty.")
 
-    # Create and save the new comment
+    # Create and save the new comment on the task's shard
+    session = shards.session_for_task(task.id)
     new_comment = Comment(content=content, task_id=task.id)
-    db.session.add(new_comment)
-    db.session.commit()
+    shards.assign_id(session, new_comment)
+    session.add(new_comment)
+    # Flush so created_at is populated before updating the task stats
+    session.flush()
+    stats.record_comment_added(new_comment, session=session)
+    session.commit()
     
     return jsonify(new_comment.to_dict()), 201
 
@@ -81,8 +163,10 @@ def get_comments_for_task(task_id):
     # Ensure the task exists
     task = get_task_or_404(task_id)
     
-    # Get all comments associated with this task
-    comments = Comment.query.filter_by(task_id=task.id).all()
+    # Get all comments associated with this task (always a single shard)
+    comments = shards.session_for_task(task.id).scalars(
+        db.select(Comment).filter_by(task_id=task.id)
+    ).all()
     
     return jsonify([comment.to_dict() for comment in comments]), 200
 
@@ -103,8 +187,10 @@ def edit_comment(comment_id):
         abort(400, description="'content' cannot be empty.")
 
     # Update the content and commit
+    session = shards.session_for_comment(comment_id)
     comment.content = content
-    db.session.commit()
+    stats.record_comment_edited(comment, session=session)
+    session.commit()
     
     return jsonify(comment.to_dict()), 200
 
@@ -117,12 +203,86 @@ def delete_comment(comment_id):
     comment = get_comment_or_404(comment_id)
     
     # Delete and commit
-    db.session.delete(comment)
-    db.session.commit()
+    session = shards.session_for_comment(comment_id)
+    stats.record_comment_deleted(comment, session=session)
+    session.delete(comment)
+    session.commit()
     
     # Return a success message
     return jsonify({'message': f'Comment with id {comment_id} deleted.'}), 200
 
+# --- Batch Route ---
+
+@bp.route('/batch', methods=['POST'])
+def batch():
+    """
+    Run several API requests in one round trip.
+
+    Body: {"requests": [{"method": "GET", "path": "/api/tasks/1", "body": {...}}, ...]}
+    Returns {"responses": [{"status": 200, "body": {...}}, ...]} in the same order.
+    Sub-requests run one after another in this app context, sharing its DB
+    sessions. The tasks and comments referenced by each run of reads (up to
+    and including the next write) are loaded together before that run.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict) or not isinstance(data.get('requests'), list):
+        abort(400, description="Missing 'requests' list in request body.")
+    if len(data['requests']) > MAX_BATCH_REQUESTS:
+        abort(400, description=f"A batch can contain at most {MAX_BATCH_REQUESTS} requests.")
+
+    # First pass: validate and route every sub-request
+    adapter = current_app.create_url_adapter(request)
+    routed = []
+    for item in data['requests']:
+        if not isinstance(item, dict) or not isinstance(item.get('path'), str):
+            abort(400, description="Each request needs a 'path' string.")
+        method = str(item.get('method', 'GET')).upper()
+        path = item['path'].partition('?')[0]
+        try:
+            endpoint, view_args = adapter.match(path, method=method)
+        except HTTPException as error:
+            routed.append((item, method, error))
+            continue
+        if not endpoint.startswith(bp.name + '.') or endpoint == request.endpoint:
+            routed.append((item, method, BadRequest(description=f"Cannot batch request to {path}.")))
+            continue
+        routed.append((item, method, view_args))
+
+    # Second pass: dispatch. 'prefetched' keeps the coalesced lookups in the
+    # identity map; it is reset after every commit or rollback, since those
+    # expire the loaded objects, and the next sub-request prefetches again.
+    responses = []
+    prefetched = None
+    for index, (item, method, view_args) in enumerate(routed):
+        if isinstance(view_args, HTTPException):
+            responses.append({'status': view_args.code, 'body': error_body(view_args)})
+            continue
+        if prefetched is None:
+            prefetched = prefetch_lookups(*collect_lookups(routed[index:]))
+        builder = EnvironBuilder(path=item['path'], method=method, json=item.get('body'))
+        try:
+            # Reuses the current app context, and with it the DB sessions
+            with current_app.request_context(builder.get_environ()):
+                response = current_app.full_dispatch_request()
+        except Exception:
+            # Only this sub-request fails; undo its uncommitted changes and carry on
+            shards.rollback()
+            current_app.logger.exception("Batch sub-request %s %s failed", method, item['path'])
+            responses.append({'status': 500, 'body': error_body(InternalServerError())})
+            prefetched = None
+            continue
+        finally:
+            builder.close()
+        body = response.get_json(silent=True)
+        if body is None and response.status_code >= 400:
+            # Non-JSON error page (e.g. a 415 from get_json()); use the usual error shape
+            body = error_body(default_exceptions.get(response.status_code, InternalServerError)())
+        responses.append({'status': response.status_code, 'body': body})
+        if method not in READ_METHODS:
+            prefetched = None
+
+    return jsonify({'responses': responses}), 200
+
 # --- Error Handlers ---
 
 @bp.app_errorhandler(400)
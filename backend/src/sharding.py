@@ -0,0 +1,227 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, g
+from flask.cli import AppGroup
+from sqlalchemy import Column, MetaData, Table, inspect, select
+from sqlalchemy.orm import Session
+
+from src.models import db, Comment, TaskStats, TaskDailyStats, CommentIdSequence
+
+# Tables that live on the comment shards. Everything keyed by task id moves
+# together so a task's comments and stats are always on the same shard.
+SHARDED_TABLES = [Comment.__table__, TaskStats.__table__, TaskDailyStats.__table__, CommentIdSequence.__table__]
+
+shards_cli = AppGroup('shards', help="Maintain the comment shards.")
+
+
+class CommentShards:
+    """
+    Optional sharding layer for comments.
+
+    When 'COMMENT_SHARDS' lists bind keys from 'SQLALCHEMY_BINDS', comments
+    (and the per-task stats) are stored on one of those binds, chosen by a
+    stable hash of the task id. Comment ids are allocated per shard as
+    'sequence * N + shard_index', so they are globally unique and the shard
+    holding a comment can be found from its id alone.
+
+    When 'COMMENT_SHARDS' is empty every method falls back to 'db.session'.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """
+        Create the sharded tables on each shard and close sessions on teardown.
+        Warns if the primary database still holds comments, which are
+        invisible once sharding is on until 'flask shards migrate' moves them.
+        """
+        app.extensions['comment_shards'] = self
+        app.teardown_appcontext(self._close_sessions)
+
+        if app.config.get('COMMENT_SHARDS'):
+            with app.app_context():
+                metadata = _shard_metadata()
+                for key in app.config['COMMENT_SHARDS']:
+                    metadata.create_all(db.engines[key])
+                if _primary_has_comments():
+                    app.logger.warning(
+                        "Comment sharding is enabled but the primary database still has comments; "
+                        "they are not served until you run 'flask shards migrate'."
+                    )
+
+    # --- Shard Selection ---
+
+    @property
+    def keys(self):
+        """Bind keys of the configured shards, or an empty list if disabled."""
+        if 'comment_shards' not in current_app.extensions:
+            return []
+        return current_app.config.get('COMMENT_SHARDS') or []
+
+    @property
+    def enabled(self):
+        return bool(self.keys)
+
+    def shard_for_task(self, task_id):
+        """Index of the shard holding all comments of a task."""
+        return zlib.crc32(str(task_id).encode()) % len(self.keys)
+
+    def shard_for_comment(self, comment_id):
+        """Index of the shard holding a comment, derived from its id."""
+        return comment_id % len(self.keys)
+
+    # --- Sessions ---
+
+    def session_for_task(self, task_id):
+        """Session for the shard holding a task's comments."""
+        if not self.enabled:
+            return db.session
+        return self._session(self.shard_for_task(task_id))
+
+    def session_for_comment(self, comment_id):
+        """Session for the shard holding a comment."""
+        if not self.enabled:
+            return db.session
+        return self._session(self.shard_for_comment(comment_id))
+
+    def sessions(self):
+        """One session per shard, e.g. for maintenance commands."""
+        if not self.enabled:
+            return [db.session]
+        return [self._session(index) for index in range(len(self.keys))]
+
+    def _session(self, index):
+        # Sessions are cached on 'g' so a request reuses one session per shard
+        if '_comment_shard_sessions' not in g:
+            g._comment_shard_sessions = {}
+        sessions = g._comment_shard_sessions
+        if index not in sessions:
+            sessions[index] = Session(bind=db.engines[self.keys[index]])
+        return sessions[index]
+
+    def rollback(self):
+        """Roll back db.session and every shard session opened in this app context."""
+        db.session.rollback()
+        for session in g.get('_comment_shard_sessions', {}).values():
+            session.rollback()
+
+    def _close_sessions(self, exception=None):
+        for session in g.pop('_comment_shard_sessions', {}).values():
+            session.close()
+
+    # --- Writes ---
+
+    def assign_id(self, session, comment):
+        """
+        Allocate a globally unique id for a new comment on its shard.
+        No-op when sharding is disabled (the database assigns the id).
+        """
+        if not self.enabled:
+            return
+        sequence = CommentIdSequence()
+        session.add(sequence)
+        session.flush()
+        comment.id = sequence.id * len(self.keys) + self.shard_for_task(comment.task_id)
+        # The row has done its job; AUTOINCREMENT/SERIAL never hand out its id
+        # again, so deleting it (in the same transaction) keeps the table empty
+        session.delete(sequence)
+
+    # --- Reads ---
+
+    def fan_out(self, task_ids, fn):
+        """
+        Call 'fn(session, task_ids)' once per shard with the task ids that
+        live there, in parallel, and merge the dictionaries it returns.
+        """
+        if not self.enabled:
+            return fn(db.session, list(task_ids))
+
+        groups = {}
+        for task_id in task_ids:
+            groups.setdefault(self.shard_for_task(task_id), []).append(task_id)
+        if not groups:
+            return {}
+
+        # Worker threads don't share the request's sessions; each opens its own
+        engines = {index: db.engines[self.keys[index]] for index in groups}
+
+        def run(index):
+            with Session(bind=engines[index]) as session:
+                return fn(session, groups[index])
+
+        merged = {}
+        with ThreadPoolExecutor(max_workers=len(groups)) as executor:
+            for result in executor.map(run, groups):
+                merged.update(result)
+        return merged
+
+
+def _primary_has_comments():
+    if not inspect(db.engine).has_table(Comment.__tablename__):
+        return False
+    with db.engine.connect() as connection:
+        return connection.execute(select(Comment.id).limit(1)).first() is not None
+
+def _shard_metadata():
+    """
+    Copy of the sharded tables without their foreign keys to 'task'.
+    Tasks stay on the primary database, so shards can't reference them.
+    """
+    metadata = MetaData()
+    for table in SHARDED_TABLES:
+        columns = [
+            Column(column.name, column.type, primary_key=column.primary_key,
+                   nullable=column.nullable, autoincrement=column.autoincrement)
+            for column in table.columns
+        ]
+        Table(table.name, metadata, *columns, **table.kwargs)
+    return metadata
+
+
+shards = CommentShards()
+
+
+# --- CLI Commands ---
+
+@shards_cli.command('migrate')
+def migrate_command():
+    """
+    Move comments from the primary database onto their shards.
+    Moved comments get new (shard-encoded) ids.
+    """
+    if not shards.enabled:
+        raise click.ClickException("Comment sharding is not enabled; set COMMENT_SHARD_URLS first.")
+    from src.stats import rebuild_task_stats
+
+    moved = 0
+    task_ids = db.session.scalars(select(Comment.task_id).distinct().order_by(Comment.task_id)).all()
+    for task_id in task_ids:
+        session = shards.session_for_task(task_id)
+        comments = db.session.scalars(
+            select(Comment).where(Comment.task_id == task_id).order_by(Comment.id)
+        ).all()
+        for comment in comments:
+            copy = Comment(content=comment.content, created_at=comment.created_at, task_id=task_id)
+            shards.assign_id(session, copy)
+            session.add(copy)
+        session.commit()
+
+        # Only delete from the primary once the copies are committed, one task
+        # at a time, so an interrupted run can simply be started again
+        for comment in comments:
+            db.session.delete(comment)
+        db.session.commit()
+        moved += len(comments)
+
+    # The primary's summaries are no longer used; the shards' are rebuilt
+    db.session.execute(db.delete(TaskDailyStats))
+    db.session.execute(db.delete(TaskStats))
+    db.session.commit()
+    for session in shards.sessions():
+        rebuild_task_stats(session)
+
+    click.echo(f"Moved {moved} comment(s) for {len(task_ids)} task(s); moved comments have new ids.")
@@ -0,0 +1,326 @@
+import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func, literal, or_
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.models import db, Task, Comment, TaskStats, TaskDailyStats
+from src.sharding import shards
+
+# Number of days covered by 'comments_per_day'
+STATS_WINDOW_DAYS = 30
+
+stats_cli = AppGroup('stats', help="Maintain the per-task activity summaries.")
+
+# --- Helper Functions ---
+
+def _today():
+    return datetime.datetime.utcnow().date()
+
+def _window_start(today):
+    """First day (inclusive) of the rolling stats window ending on 'today'."""
+    return today - datetime.timedelta(days=STATS_WINDOW_DAYS - 1)
+
+def _per_day(buckets, today):
+    """Zero-filled list of daily counts for the window, oldest day first."""
+    start = _window_start(today)
+    days = (start + datetime.timedelta(days=i) for i in range(STATS_WINDOW_DAYS))
+    return [{'date': day.isoformat(), 'count': buckets.get(day, 0)} for day in days]
+
+def _serialize(task_id, stats, buckets, today):
+    data = stats.to_dict() if stats else {
+        'task_id': task_id,
+        'comment_count': 0,
+        'last_comment_at': None,
+        'last_activity_at': None
+    }
+    data['comments_per_day'] = _per_day(buckets, today)
+    return data
+
+# --- Write Path (called by the comment routes before they commit) ---
+# 'session' is the session holding the comment, so the stats are written in
+# the same transaction (and on the same shard) as the comment itself.
+#
+# Every write is an upsert, so concurrent requests can't race on creating a
+# row or lose an update. A missing row (e.g. a task whose comments predate the
+# summary tables) is first built from the comments table, together with the
+# task's daily buckets for the whole window.
+
+def _insert(session, model):
+    """INSERT supporting ON CONFLICT for the session's dialect (SQLite or PostgreSQL)."""
+    if session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+def _later(column, value):
+    """SQL for the later of a nullable datetime column and 'value'."""
+    return case((or_(column.is_(None), column < value), value), else_=column)
+
+def _decrement(column):
+    """SQL for 'column - 1', never going below zero."""
+    return case((column > 0, column - 1), else_=0)
+
+def _day_bounds(day):
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return start, start + datetime.timedelta(days=1)
+
+def _upsert_stats(session, task_id, comments, row_set, conflict_set):
+    """
+    Create the task's stats row from 'comments' (a filter on the comments
+    table), or apply 'conflict_set' to the existing row.
+    'row_set' supplies the remaining column values for a new row.
+    """
+    source = db.select(
+        literal(task_id),
+        func.count(Comment.id),
+        func.max(Comment.created_at),
+        literal(row_set['last_activity_at'], type_=db.DateTime)
+    ).where(Comment.task_id == task_id, *comments)
+    stmt = _insert(session, TaskStats).from_select(
+        ['task_id', 'comment_count', 'last_comment_at', 'last_activity_at'], source
+    )
+    session.execute(stmt.on_conflict_do_update(index_elements=['task_id'], set_=conflict_set))
+
+def _upsert_daily(session, task_id, day, comments, conflict_set):
+    """Same as _upsert_stats, for the task's bucket on 'day'."""
+    start, end = _day_bounds(day)
+    source = db.select(
+        literal(task_id),
+        literal(day, type_=db.Date),
+        func.count(Comment.id)
+    ).where(Comment.task_id == task_id, Comment.created_at >= start, Comment.created_at < end, *comments)
+    stmt = _insert(session, TaskDailyStats).from_select(['task_id', 'day', 'comment_count'], source)
+    session.execute(stmt.on_conflict_do_update(index_elements=['task_id', 'day'], set_=conflict_set))
+
+def _backfill_daily(session, task_id, skip_day, comments):
+    """
+    Fill the task's daily buckets for the window from 'comments', except
+    'skip_day', whose bucket the caller upserts itself. Existing buckets are
+    left alone. Only needed when the task has no stats row yet.
+    """
+    skip_start, skip_end = _day_bounds(skip_day)
+    day = func.date(Comment.created_at, type_=db.Date)
+    source = db.select(literal(task_id), day, func.count(Comment.id)).where(
+        Comment.task_id == task_id,
+        Comment.created_at >= datetime.datetime.combine(_window_start(_today()), datetime.time.min),
+        or_(Comment.created_at < skip_start, Comment.created_at >= skip_end),
+        *comments
+    ).group_by(day)
+    stmt = _insert(session, TaskDailyStats).from_select(['task_id', 'day', 'comment_count'], source)
+    session.execute(stmt.on_conflict_do_nothing(index_elements=['task_id', 'day']))
+
+def _has_stats(session, task_id):
+    return session.scalar(db.select(TaskStats.task_id).where(TaskStats.task_id == task_id)) is not None
+
+def record_comment_added(comment, session=None):
+    """
+    Account for a newly created comment.
+    The comment must already be flushed so that it is counted when the
+    stats row is built from the comments table.
+    """
+    session = session or db.session
+    stats, daily = TaskStats.__table__.c, TaskDailyStats.__table__.c
+    day = comment.created_at.date()
+
+    if not _has_stats(session, comment.task_id):
+        _backfill_daily(session, comment.task_id, day, [])
+    _upsert_stats(session, comment.task_id, [], {'last_activity_at': comment.created_at}, {
+        'comment_count': stats.comment_count + 1,
+        'last_comment_at': _later(stats.last_comment_at, comment.created_at),
+        'last_activity_at': _later(stats.last_activity_at, comment.created_at)
+    })
+    _upsert_daily(session, comment.task_id, day, [], {
+        'comment_count': daily.comment_count + 1
+    })
+
+    # Drop buckets that have fallen out of the window
+    session.execute(
+        db.delete(TaskDailyStats).where(
+            TaskDailyStats.task_id == comment.task_id,
+            TaskDailyStats.day < _window_start(_today())
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+def record_comment_edited(comment, session=None):
+    """
+    Account for an edit to an existing comment.
+    Only touches an existing stats row; edits don't change any counts.
+    """
+    session = session or db.session
+    session.execute(
+        db.update(TaskStats)
+        .where(TaskStats.task_id == comment.task_id)
+        .values(last_activity_at=datetime.datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+
+def record_comment_deleted(comment, session=None):
+    """
+    Account for a comment that is about to be deleted.
+    Must be called before the comment is removed from the session.
+    """
+    session = session or db.session
+    stats, daily = TaskStats.__table__.c, TaskDailyStats.__table__.c
+    others = [Comment.id != comment.id]
+    now = datetime.datetime.utcnow()
+    day = comment.created_at.date()
+
+    if not _has_stats(session, comment.task_id):
+        _backfill_daily(session, comment.task_id, day, others)
+
+    # Latest remaining comment; only used (see CASE below) if this one was the latest
+    latest = db.select(func.max(Comment.created_at)).where(
+        Comment.task_id == comment.task_id, *others
+    ).scalar_subquery()
+    _upsert_stats(session, comment.task_id, others, {'last_activity_at': now}, {
+        'comment_count': _decrement(stats.comment_count),
+        'last_comment_at': case((stats.last_comment_at <= comment.created_at, latest),
+                                else_=stats.last_comment_at),
+        'last_activity_at': now
+    })
+
+    if day >= _window_start(_today()):
+        _upsert_daily(session, comment.task_id, day, others, {
+            'comment_count': _decrement(daily.comment_count)
+        })
+
+# --- Read Path ---
+
+def _load_stats(session, task_ids, today):
+    """Serialized stats for the given tasks, read from the summary tables only."""
+    stored = {
+        stats.task_id: stats
+        for stats in session.scalars(db.select(TaskStats).where(TaskStats.task_id.in_(task_ids)))
+    }
+    buckets = {}
+    daily = session.scalars(
+        db.select(TaskDailyStats).where(
+            TaskDailyStats.task_id.in_(task_ids),
+            TaskDailyStats.day >= _window_start(today)
+        )
+    )
+    for row in daily:
+        buckets.setdefault(row.task_id, {})[row.day] = row.comment_count
+    return {
+        task_id: _serialize(task_id, stored.get(task_id), buckets.get(task_id, {}), today)
+        for task_id in task_ids
+    }
+
+def get_task_stats(task_id, session=None):
+    """Stats for a single task."""
+    session = session or db.session
+    return _load_stats(session, [task_id], _today())[task_id]
+
+def get_all_task_stats():
+    """Stats for every task, ordered by task id, gathered from all shards."""
+    today = _today()
+    task_ids = db.session.scalars(db.select(Task.id).order_by(Task.id)).all()
+    loaded = shards.fan_out(task_ids, lambda session, ids: _load_stats(session, ids, today))
+    return [loaded[task_id] for task_id in task_ids]
+
+# --- Rebuild / Consistency Check ---
+
+def _compute_from_comments(session, today):
+    """
+    Aggregate the comments table into the shape stored in the summary tables.
+    Returns ({task_id: (comment_count, last_comment_at)}, {(task_id, day): count}).
+    """
+    totals = {
+        task_id: (count, last)
+        for task_id, count, last in session.execute(
+            db.select(Comment.task_id, func.count(Comment.id), func.max(Comment.created_at))
+            .group_by(Comment.task_id)
+        )
+    }
+
+    day = func.date(Comment.created_at, type_=db.Date)
+    daily = {
+        (task_id, bucket_day): count
+        for task_id, bucket_day, count in session.execute(
+            db.select(Comment.task_id, day, func.count(Comment.id))
+            .where(Comment.created_at >= datetime.datetime.combine(_window_start(today), datetime.time.min))
+            .group_by(Comment.task_id, day)
+        )
+    }
+    return totals, daily
+
+def rebuild_task_stats(session=None):
+    """
+    Recompute both summary tables from the comments table.
+    Returns the number of tasks with a summary row.
+    """
+    session = session or db.session
+    totals, daily = _compute_from_comments(session, _today())
+
+    session.execute(db.delete(TaskDailyStats))
+    session.execute(db.delete(TaskStats))
+    for task_id, (count, last) in totals.items():
+        session.add(TaskStats(
+            task_id=task_id,
+            comment_count=count,
+            last_comment_at=last,
+            last_activity_at=last
+        ))
+    for (task_id, day), count in daily.items():
+        session.add(TaskDailyStats(task_id=task_id, day=day, comment_count=count))
+    session.commit()
+    return len(totals)
+
+def check_task_stats(session=None):
+    """
+    Compare the summary tables against the comments table.
+    Returns a list of mismatches; an empty list means the summaries are consistent.
+    """
+    session = session or db.session
+    today = _today()
+    totals, daily = _compute_from_comments(session, today)
+    problems = []
+
+    stored = {stats.task_id: stats for stats in session.scalars(db.select(TaskStats))}
+    for task_id in sorted(set(totals) | set(stored)):
+        expected_count, expected_last = totals.get(task_id, (0, None))
+        stats = stored.get(task_id)
+        actual_count = stats.comment_count if stats else 0
+        actual_last = stats.last_comment_at if stats else None
+        if actual_count != expected_count:
+            problems.append({'task_id': task_id, 'field': 'comment_count',
+                             'expected': expected_count, 'actual': actual_count})
+        if actual_last != expected_last:
+            problems.append({'task_id': task_id, 'field': 'last_comment_at',
+                             'expected': expected_last, 'actual': actual_last})
+
+    stored_daily = {
+        (row.task_id, row.day): row.comment_count
+        for row in session.scalars(
+            db.select(TaskDailyStats).where(TaskDailyStats.day >= _window_start(today))
+        )
+    }
+    for key in sorted(set(daily) | set(stored_daily)):
+        expected, actual = daily.get(key, 0), stored_daily.get(key, 0)
+        if expected != actual:
+            problems.append({'task_id': key[0], 'field': f'comments_per_day[{key[1].isoformat()}]',
+                             'expected': expected, 'actual': actual})
+    return problems
+
+# --- CLI Commands ---
+
+@stats_cli.command('rebuild')
+def rebuild_command():
+    """Recompute task stats from the comments table."""
+    count = sum(rebuild_task_stats(session) for session in shards.sessions())
+    click.echo(f"Rebuilt stats for {count} task(s).")
+
+@stats_cli.command('check')
+def check_command():
+    """Report task stats that disagree with the comments table."""
+    problems = [problem for session in shards.sessions() for problem in check_task_stats(session)]
+    for problem in problems:
+        click.echo(
+            f"task {problem['task_id']}: {problem['field']} "
+            f"expected {problem['expected']}, found {problem['actual']}"
+        )
+    if problems:
+        raise click.ClickException(f"{len(problems)} inconsistency(ies) found; run 'flask stats rebuild'.")
+    click.echo("Task stats are consistent.")
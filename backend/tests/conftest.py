@@ -1,9 +1,43 @@
+import json
+from contextlib import contextmanager
+
 import pytest
 from flask import Flask
+from sqlalchemy import event
 from src.models import db, Task, Comment
 from src.routes import bp
 
 
+def add_comment(client, task_id, content):
+    """Add a comment through the API so the stats are maintained."""
+    return client.post(
+        f'/api/tasks/{task_id}/comments',
+        data=json.dumps({'content': content}),
+        content_type='application/json'
+    ).get_json()
+
+
+@contextmanager
+def count_queries():
+    """
+    Record the SELECT statements issued against every database while active,
+    as (bind_key, statement) pairs; the bind key is None for the primary database.
+    """
+    statements = []
+    listeners = []
+    for key, engine in db.engines.items():
+        def before_cursor_execute(conn, cursor, statement, *args, key=key):
+            if statement.lstrip().upper().startswith('SELECT'):
+                statements.append((key, statement))
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+        listeners.append((engine, before_cursor_execute))
+    try:
+        yield statements
+    finally:
+        for engine, listener in listeners:
+            event.remove(engine, 'before_cursor_execute', listener)
+
+
 @pytest.fixture
 def app():
     """Create and configure a test Flask application."""
@@ -51,7 +85,7 @@ def sample_task(app):
         # Refresh to get the ID
         db.session.refresh(task)
         task_id = task.id
-        task_data = task.to_dict()
+        task_data = task.to_dict(comment_count=0)
     return task_data
 
 
@@ -69,7 +103,7 @@ def sample_tasks(app):
         db.session.commit()
         
         # Get task data
-        task_data = [task.to_dict() for task in tasks]
+        task_data = [task.to_dict(comment_count=0) for task in tasks]
     return task_data
 
 
@@ -0,0 +1,124 @@
+import json
+
+from src.routes import MAX_BATCH_REQUESTS
+from tests.conftest import count_queries
+
+
+def post_batch(client, requests):
+    return client.post(
+        '/api/batch',
+        data=json.dumps({'requests': requests}),
+        content_type='application/json'
+    )
+
+
+# ===========================
+# Batch Route Tests
+# ===========================
+
+class TestBatchRoutes:
+    """Tests for the batch endpoint."""
+
+    def test_batch_get_tasks_and_comments(self, client, sample_tasks, sample_comments):
+        """Test that sub-request results are returned in order."""
+        response = post_batch(client, [
+            {'method': 'GET', 'path': f'/api/tasks/{sample_tasks[0]["id"]}'},
+            {'method': 'GET', 'path': f'/api/tasks/{sample_tasks[1]["id"]}'},
+            {'path': f'/api/tasks/{sample_comments[0]["task_id"]}/comments'}
+        ])
+
+        assert response.status_code == 200
+        results = response.get_json()['responses']
+        assert [result['status'] for result in results] == [200, 200, 200]
+        assert results[0]['body']['title'] == 'Task 1'
+        assert results[1]['body']['title'] == 'Task 2'
+        assert [comment['content'] for comment in results[2]['body']] == [
+            'First comment', 'Second comment', 'Third comment'
+        ]
+
+    def test_batch_reports_errors_per_request(self, client, sample_task):
+        """Test that a failing sub-request doesn't fail the whole batch."""
+        response = post_batch(client, [
+            {'method': 'GET', 'path': '/api/tasks/9999'},
+            {'method': 'GET', 'path': '/api/nowhere'},
+            {'method': 'DELETE', 'path': f'/api/tasks/{sample_task["id"]}'},
+            {'method': 'POST', 'path': '/api/batch', 'body': {'requests': []}},
+            {'method': 'GET', 'path': f'/api/tasks/{sample_task["id"]}'}
+        ])
+
+        assert response.status_code == 200
+        results = response.get_json()['responses']
+        assert [result['status'] for result in results] == [404, 404, 405, 400, 200]
+        assert 'not found' in results[0]['body']['message'].lower()
+
+    def test_batch_isolates_server_errors(self, client, sample_task):
+        """Test that an unexpected error in one sub-request only fails that entry."""
+        path = f'/api/tasks/{sample_task["id"]}/comments'
+        response = post_batch(client, [
+            {'method': 'POST', 'path': path, 'body': {'content': 'Before'}},
+            {'method': 'POST', 'path': path, 'body': {'content': 123}},
+            {'method': 'POST', 'path': path, 'body': {'content': 'After'}},
+            {'method': 'GET', 'path': path}
+        ])
+
+        assert response.status_code == 200
+        results = response.get_json()['responses']
+        assert [result['status'] for result in results] == [201, 500, 201, 200]
+        assert results[1]['body']['error'] == 'Internal Server Error'
+        assert [comment['content'] for comment in results[3]['body']] == ['Before', 'After']
+
+    def test_batch_writes(self, client, sample_task):
+        """Test that write sub-requests are applied and visible to later ones."""
+        response = post_batch(client, [
+            {'method': 'POST', 'path': f'/api/tasks/{sample_task["id"]}/comments',
+             'body': {'content': 'Batched comment'}},
+            {'method': 'POST', 'path': f'/api/tasks/{sample_task["id"]}/comments', 'body': {}},
+            {'method': 'GET', 'path': f'/api/tasks/{sample_task["id"]}'}
+        ])
+
+        results = response.get_json()['responses']
+        assert results[0]['status'] == 201
+        assert results[0]['body']['content'] == 'Batched comment'
+        assert results[1]['status'] == 400
+        assert results[2]['body']['comment_count'] == 1
+
+    def test_batch_write_without_body(self, client, sample_task):
+        """Test that non-JSON error responses get the usual JSON error body."""
+        response = post_batch(client, [
+            {'method': 'POST', 'path': f'/api/tasks/{sample_task["id"]}/comments'}
+        ])
+
+        result = response.get_json()['responses'][0]
+        assert result['status'] == 415
+        assert result['body']['error'] == 'Unsupported Media Type'
+        assert result['body']['message']
+
+    def test_batch_invalid_body(self, client):
+        """Test batch requests with a malformed body."""
+        response = client.post('/api/batch', data=json.dumps({}), content_type='application/json')
+        assert response.status_code == 400
+
+        response = post_batch(client, [{'method': 'GET'}])
+        assert response.status_code == 400
+
+        response = client.post('/api/batch', data=json.dumps([1, 2]), content_type='application/json')
+        assert response.status_code == 400
+        assert 'requests' in response.get_json()['message']
+
+        response = post_batch(client, [{'path': '/api/tasks'}] * (MAX_BATCH_REQUESTS + 1))
+        assert response.status_code == 400
+
+    def test_batch_coalesces_lookups(self, client, sample_tasks):
+        """Test that a batch needs fewer queries than the same requests sent one by one."""
+        paths = [f'/api/tasks/{task["id"]}' for task in sample_tasks] * 2
+
+        with count_queries() as separate:
+            expected = [client.get(path).get_json() for path in paths]
+
+        with count_queries() as batched:
+            response = post_batch(client, [{'path': path} for path in paths])
+
+        assert [result['body'] for result in response.get_json()['responses']] == expected
+        task_lookups = [statement for _, statement in batched if 'FROM task' in statement]
+        assert len(task_lookups) == 1
+        assert len(batched) < len(separate)
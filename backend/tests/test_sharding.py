@@ -0,0 +1,238 @@
+import json
+from collections import Counter
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from src.models import db, Comment, CommentIdSequence
+from src.routes import bp
+from src.sharding import shards, shards_cli
+from src.stats import stats_cli
+from tests.conftest import add_comment, count_queries
+
+SHARD_COUNT = 3
+
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a test Flask application with comments sharded across SQLite files."""
+    app = Flask(__name__)
+
+    app.config['TESTING'] = True
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{tmp_path / "primary.db"}'
+    app.config['SQLALCHEMY_BINDS'] = {
+        f'shard{index}': f'sqlite:///{tmp_path / f"shard{index}.db"}'
+        for index in range(SHARD_COUNT)
+    }
+    app.config['COMMENT_SHARDS'] = [f'shard{index}' for index in range(SHARD_COUNT)]
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    db.init_app(app)
+    app.register_blueprint(bp)
+    shards.init_app(app)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    # db.init_app() registers a metadata per bind key on the shared 'db';
+    # drop them so apps created by other tests don't expect these binds
+    for key in app.config['SQLALCHEMY_BINDS']:
+        db.metadatas.pop(key, None)
+
+
+def create_tasks(client, count):
+    """Create tasks through the API and return their ids."""
+    return [
+        client.post(
+            '/api/tasks',
+            data=json.dumps({'title': f'Task {index}'}),
+            content_type='application/json'
+        ).get_json()['id']
+        for index in range(count)
+    ]
+
+
+def comments_on_shard(index):
+    """(id, task_id) pairs stored directly on a shard."""
+    engine = db.engines[f'shard{index}']
+    with engine.connect() as connection:
+        return set(connection.execute(select(Comment.id, Comment.task_id)).all())
+
+
+# ===========================
+# Sharding Tests
+# ===========================
+
+class TestCommentSharding:
+    """Tests for routing comments to shards by task id."""
+
+    def test_task_comments_stay_on_one_shard(self, app, client):
+        """Test that every comment of a task is stored on that task's shard."""
+        task_ids = create_tasks(client, 6)
+        for task_id in task_ids:
+            add_comment(client, task_id, 'First')
+            add_comment(client, task_id, 'Second')
+
+        for task_id in task_ids:
+            expected = shards.shard_for_task(task_id)
+            for index in range(SHARD_COUNT):
+                on_shard = [row for row in comments_on_shard(index) if row[1] == task_id]
+                assert len(on_shard) == (2 if index == expected else 0)
+
+        # Comments are spread over more than one shard
+        assert sum(1 for index in range(SHARD_COUNT) if comments_on_shard(index)) > 1
+
+        # Nothing is written to the primary database
+        assert db.session.scalars(select(Comment)).all() == []
+
+    def test_comment_ids_are_globally_unique(self, client):
+        """Test that comment ids don't collide across shards and encode their shard."""
+        task_ids = create_tasks(client, 6)
+        comments = [add_comment(client, task_id, 'Comment') for task_id in task_ids for _ in range(3)]
+
+        ids = [comment['id'] for comment in comments]
+        assert len(set(ids)) == len(ids)
+        for comment in comments:
+            assert shards.shard_for_comment(comment['id']) == shards.shard_for_task(comment['task_id'])
+
+        # Deleting the newest comments doesn't make their ids available again
+        for comment in comments[-3:]:
+            client.delete(f'/api/comments/{comment["id"]}')
+        newer = [add_comment(client, task_ids[-1], 'Comment')['id'] for _ in range(3)]
+        assert not set(newer) & set(ids)
+
+    def test_id_sequence_rows_are_not_kept(self, client):
+        """Test that allocating comment ids doesn't grow the sequence table."""
+        task_ids = create_tasks(client, 4)
+        for task_id in task_ids:
+            add_comment(client, task_id, 'Comment')
+
+        for index in range(SHARD_COUNT):
+            with db.engines[f'shard{index}'].connect() as connection:
+                assert connection.execute(select(CommentIdSequence)).all() == []
+
+    def test_comment_crud_across_shards(self, client):
+        """Test reading, editing and deleting comments that live on different shards."""
+        task_ids = create_tasks(client, 4)
+        comments = {task_id: add_comment(client, task_id, f'Comment on {task_id}') for task_id in task_ids}
+
+        for task_id, comment in comments.items():
+            data = client.get(f'/api/tasks/{task_id}/comments').get_json()
+            assert [c['id'] for c in data] == [comment['id']]
+
+            response = client.put(
+                f'/api/comments/{comment["id"]}',
+                data=json.dumps({'content': 'Edited'}),
+                content_type='application/json'
+            )
+            assert response.get_json()['content'] == 'Edited'
+
+            assert client.delete(f'/api/comments/{comment["id"]}').status_code == 200
+            assert client.get(f'/api/tasks/{task_id}/comments').get_json() == []
+
+    def test_task_listing_merges_counts_from_all_shards(self, client):
+        """Test that the task listing fans out to every shard for comment counts."""
+        task_ids = create_tasks(client, 5)
+        for count, task_id in enumerate(task_ids):
+            for _ in range(count):
+                add_comment(client, task_id, 'Comment')
+
+        data = client.get('/api/tasks').get_json()
+        assert [task['comment_count'] for task in data] == [0, 1, 2, 3, 4]
+
+        single = client.get(f'/api/tasks/{task_ids[3]}').get_json()
+        assert single['comment_count'] == 3
+
+    def test_stats_across_shards(self, client, runner):
+        """Test that task stats are kept on, and read from, each task's shard."""
+        task_ids = create_tasks(client, 4)
+        for task_id in task_ids:
+            add_comment(client, task_id, 'Comment')
+        add_comment(client, task_ids[0], 'Another comment')
+
+        data = client.get('/api/tasks/stats').get_json()
+        assert [stats['comment_count'] for stats in data] == [2, 1, 1, 1]
+        assert client.get(f'/api/tasks/{task_ids[0]}/stats').get_json()['comment_count'] == 2
+
+        result = runner.invoke(stats_cli, ['check'])
+        assert result.exit_code == 0
+
+        result = runner.invoke(stats_cli, ['rebuild'])
+        assert result.exit_code == 0
+        assert 'for 4 task(s)' in result.output
+
+
+# ===========================
+# Migration Tests
+# ===========================
+
+class TestShardMigration:
+    """Tests for moving pre-existing comments onto the shards."""
+
+    def test_migrate_moves_primary_comments(self, client, runner):
+        """Test that comments written before sharding are moved and served again."""
+        task_ids = create_tasks(client, 4)
+        # Comments left in the primary database from before sharding was enabled
+        for task_id in task_ids:
+            db.session.add_all([Comment(content=f'Old {task_id}', task_id=task_id) for _ in range(2)])
+        db.session.commit()
+        assert client.get(f'/api/tasks/{task_ids[0]}/comments').get_json() == []
+
+        result = runner.invoke(shards_cli, ['migrate'])
+        assert result.exit_code == 0
+        assert 'Moved 8 comment(s) for 4 task(s)' in result.output
+
+        assert db.session.scalars(select(Comment)).all() == []
+        for task_id in task_ids:
+            comments = client.get(f'/api/tasks/{task_id}/comments').get_json()
+            assert [comment['content'] for comment in comments] == [f'Old {task_id}'] * 2
+            # New ids route to the right shard
+            assert client.delete(f'/api/comments/{comments[0]["id"]}').status_code == 200
+            assert client.get(f'/api/tasks/{task_id}/stats').get_json()['comment_count'] == 1
+
+        assert runner.invoke(stats_cli, ['check']).exit_code == 0
+
+
+# ===========================
+# Sharded Batch Tests
+# ===========================
+
+class TestShardedBatch:
+    """Tests for the batch endpoint with comments on several shards."""
+
+    def test_batch_mixing_reads_and_writes(self, client):
+        """Test lookups are coalesced per shard between the writes of a batch."""
+        task_ids = create_tasks(client, 4)
+        comments = [add_comment(client, task_id, f'Comment on {task_id}') for task_id in task_ids]
+
+        requests = (
+            [{'path': f'/api/tasks/{task_id}'} for task_id in task_ids]
+            + [{'method': 'PUT', 'path': f'/api/comments/{comment["id"]}', 'body': {'content': 'Edited'}}
+               for comment in comments]
+            + [{'path': f'/api/tasks/{task_id}/comments'} for task_id in task_ids]
+        )
+        with count_queries() as statements:
+            response = client.post('/api/batch', data=json.dumps({'requests': requests}),
+                                   content_type='application/json')
+        counts = Counter(key for key, _ in statements)
+
+        results = response.get_json()['responses']
+        assert [result['status'] for result in results] == [200] * 12
+        assert [result['body']['comment_count'] for result in results[:4]] == [1] * 4
+        assert [result['body']['content'] for result in results[4:8]] == ['Edited'] * 4
+        assert [[c['content'] for c in result['body']] for result in results[8:]] == [['Edited']] * 4
+
+        # Primary: one IN query for the tasks before the first write, one
+        # after the last write (the PUTs in between don't reference tasks)
+        assert counts[None] == 2
+        # Each shard, per task on it: comment count, comment lookup for the
+        # PUT, reload of the edited comment after its commit, comment listing
+        per_shard = Counter(shards.shard_for_task(task_id) for task_id in task_ids)
+        for index in range(SHARD_COUNT):
+            assert counts[f'shard{index}'] == 4 * per_shard[index]
@@ -0,0 +1,238 @@
+import datetime
+import json
+
+from src.models import db, Comment, TaskStats, TaskDailyStats
+from src.stats import stats_cli, check_task_stats, STATS_WINDOW_DAYS
+from tests.conftest import add_comment
+
+
+def today_count(stats):
+    """Number of comments counted for today in a stats payload."""
+    return stats['comments_per_day'][-1]['count']
+
+
+# ===========================
+# Task Stats Route Tests
+# ===========================
+
+class TestTaskStatsRoutes:
+    """Tests for the task stats endpoints."""
+
+    def test_stats_for_task_without_comments(self, client, sample_task):
+        """Test stats for a task that has no comments yet."""
+        response = client.get(f'/api/tasks/{sample_task["id"]}/stats')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['task_id'] == sample_task['id']
+        assert data['comment_count'] == 0
+        assert data['last_comment_at'] is None
+        assert len(data['comments_per_day']) == STATS_WINDOW_DAYS
+        assert all(day['count'] == 0 for day in data['comments_per_day'])
+
+    def test_stats_for_nonexistent_task(self, client):
+        """Test stats for a task that doesn't exist."""
+        response = client.get('/api/tasks/9999/stats')
+
+        assert response.status_code == 404
+
+    def test_stats_after_adding_comments(self, client, sample_task):
+        """Test that adding comments updates the stats."""
+        add_comment(client, sample_task['id'], 'Comment 1')
+        second = add_comment(client, sample_task['id'], 'Comment 2')
+
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 2
+        assert data['last_comment_at'] == second['created_at']
+        assert data['comments_per_day'][-1]['date'] == datetime.datetime.utcnow().date().isoformat()
+        assert today_count(data) == 2
+
+    def test_stats_after_editing_comment(self, client, sample_task):
+        """Test that editing a comment updates the last activity only."""
+        comment = add_comment(client, sample_task['id'], 'Comment')
+        client.put(
+            f'/api/comments/{comment["id"]}',
+            data=json.dumps({'content': 'Edited'}),
+            content_type='application/json'
+        )
+
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 1
+        assert data['last_comment_at'] == comment['created_at']
+        assert data['last_activity_at'] >= comment['created_at']
+
+    def test_stats_after_deleting_comments(self, client, sample_task):
+        """Test that deleting comments updates the stats."""
+        first = add_comment(client, sample_task['id'], 'Comment 1')
+        second = add_comment(client, sample_task['id'], 'Comment 2')
+
+        client.delete(f'/api/comments/{second["id"]}')
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 1
+        assert data['last_comment_at'] == first['created_at']
+        assert today_count(data) == 1
+
+        client.delete(f'/api/comments/{first["id"]}')
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 0
+        assert data['last_comment_at'] is None
+        assert today_count(data) == 0
+
+    def test_stats_for_all_tasks(self, client, sample_tasks):
+        """Test getting stats for all tasks."""
+        add_comment(client, sample_tasks[0]['id'], 'Comment 1')
+        add_comment(client, sample_tasks[0]['id'], 'Comment 2')
+        add_comment(client, sample_tasks[2]['id'], 'Comment 3')
+
+        response = client.get('/api/tasks/stats')
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert [stats['task_id'] for stats in data] == [task['id'] for task in sample_tasks]
+        assert [stats['comment_count'] for stats in data] == [2, 0, 1]
+
+
+# ===========================
+# Pre-existing Comment Tests
+# ===========================
+
+class TestTaskStatsWithoutSummary:
+    """Tests for tasks whose comments were written before (or outside) the stats."""
+
+    def test_edit_and_delete_without_stats_row(self, client, sample_comments):
+        """Test that edit/delete on a task without a stats row never go negative."""
+        task_id = sample_comments[0]['task_id']
+        comment_id = sample_comments[0]['id']
+
+        client.put(
+            f'/api/comments/{comment_id}',
+            data=json.dumps({'content': 'Edited'}),
+            content_type='application/json'
+        )
+        client.delete(f'/api/comments/{comment_id}')
+
+        data = client.get(f'/api/tasks/{task_id}/stats').get_json()
+        assert data['comment_count'] == 2
+        assert data['last_comment_at'] == sample_comments[2]['created_at']
+        assert today_count(data) == 2
+        assert check_task_stats() == []
+
+    def test_add_without_stats_row(self, client, sample_comments):
+        """Test that the first tracked comment counts the existing ones too."""
+        task_id = sample_comments[0]['task_id']
+        comment = add_comment(client, task_id, 'Fourth comment')
+
+        data = client.get(f'/api/tasks/{task_id}/stats').get_json()
+        assert data['comment_count'] == 4
+        assert data['last_comment_at'] == comment['created_at']
+        assert today_count(data) == 4
+        assert check_task_stats() == []
+
+    def test_earlier_days_without_stats_row(self, app, client, sample_task):
+        """Test that building a missing stats row also fills the earlier days of the window."""
+        now = datetime.datetime.utcnow()
+        with app.app_context():
+            for days_ago in (5, 5, 12):
+                db.session.add(Comment(content='Earlier comment', task_id=sample_task['id'],
+                                       created_at=now - datetime.timedelta(days=days_ago)))
+            db.session.commit()
+
+        comment = add_comment(client, sample_task['id'], 'New comment')
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 4
+        assert sum(day['count'] for day in data['comments_per_day']) == 4
+        assert data['comments_per_day'][-6]['count'] == 2
+        assert check_task_stats() == []
+
+        client.delete(f'/api/comments/{comment["id"]}')
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert sum(day['count'] for day in data['comments_per_day']) == 3
+        assert check_task_stats() == []
+
+    def test_delete_earlier_comment_without_stats_row(self, app, client, sample_task):
+        """Test deleting an earlier comment as the first tracked change of a task."""
+        now = datetime.datetime.utcnow()
+        with app.app_context():
+            comments = [
+                Comment(content='Earlier comment', task_id=sample_task['id'],
+                        created_at=now - datetime.timedelta(days=days_ago))
+                for days_ago in (3, 3, 7)
+            ]
+            db.session.add_all(comments)
+            db.session.commit()
+            comment_id = comments[0].id
+
+        client.delete(f'/api/comments/{comment_id}')
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 2
+        assert data['comments_per_day'][-4]['count'] == 1
+        assert data['comments_per_day'][-8]['count'] == 1
+        assert check_task_stats() == []
+
+    def test_delete_never_goes_negative(self, app, client, sample_task):
+        """Test that a stale stats row is clamped at zero."""
+        comment = add_comment(client, sample_task['id'], 'Comment')
+        with app.app_context():
+            # Simulate drift: the row says 0 although a comment exists
+            db.session.execute(db.update(TaskStats).values(comment_count=0))
+            db.session.execute(db.update(TaskDailyStats).values(comment_count=0))
+            db.session.commit()
+
+        client.delete(f'/api/comments/{comment["id"]}')
+
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 0
+        assert today_count(data) == 0
+
+
+# ===========================
+# Rebuild / Check Tests
+# ===========================
+
+class TestTaskStatsMaintenance:
+    """Tests for the stats rebuild and consistency check commands."""
+
+    def test_check_consistent_after_api_writes(self, client, runner, sample_task):
+        """Test that stats maintained by the API pass the consistency check."""
+        comment = add_comment(client, sample_task['id'], 'Comment 1')
+        add_comment(client, sample_task['id'], 'Comment 2')
+        client.delete(f'/api/comments/{comment["id"]}')
+
+        assert check_task_stats() == []
+        result = runner.invoke(stats_cli, ['check'])
+        assert result.exit_code == 0
+        assert 'consistent' in result.output
+
+    def test_check_detects_drift(self, runner, sample_comments):
+        """Test that comments written outside the API are reported."""
+        problems = check_task_stats()
+        assert {'task_id': sample_comments[0]['task_id'], 'field': 'comment_count',
+                'expected': 3, 'actual': 0} in problems
+
+        result = runner.invoke(stats_cli, ['check'])
+        assert result.exit_code != 0
+        assert 'comment_count' in result.output
+
+    def test_rebuild_fixes_drift(self, client, runner, sample_task, sample_comments):
+        """Test that rebuilding recomputes the stats from the comments."""
+        result = runner.invoke(stats_cli, ['rebuild'])
+        assert result.exit_code == 0
+        assert check_task_stats() == []
+
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 3
+        assert today_count(data) == 3
+
+    def test_rebuild_ignores_comments_outside_window(self, app, client, runner, sample_task):
+        """Test that old comments count towards the total but not the daily window."""
+        old = datetime.datetime.utcnow() - datetime.timedelta(days=STATS_WINDOW_DAYS + 5)
+        with app.app_context():
+            db.session.add(Comment(content='Old comment', task_id=sample_task['id'], created_at=old))
+            db.session.commit()
+
+        result = runner.invoke(stats_cli, ['rebuild'])
+        assert result.exit_code == 0
+
+        data = client.get(f'/api/tasks/{sample_task["id"]}/stats').get_json()
+        assert data['comment_count'] == 1
+        assert sum(day['count'] for day in data['comments_per_day']) == 0